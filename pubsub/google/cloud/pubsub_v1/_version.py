@@ -0,0 +1,30 @@
+# Copyright 2018, Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The installed version of the ``google-cloud-pubsub`` package.
+
+:mod:`importlib.metadata` is used where it is available (Python 3.8+), as
+importing :mod:`pkg_resources` scans every installed distribution.
+"""
+
+from __future__ import absolute_import
+
+# Only one of the branches below runs on any given Python version.
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # Python < 3.8  # pragma: NO COVER
+    import pkg_resources
+    __version__ = pkg_resources.get_distribution('google-cloud-pubsub').version
+else:  # pragma: NO COVER
+    __version__ = importlib_metadata.version('google-cloud-pubsub')
@@ -16,7 +16,6 @@ from __future__ import absolute_import
 
 import copy
 import os
-import pkg_resources
 
 import grpc
 import six
@@ -24,12 +23,13 @@ import six
 from google.api_core import grpc_helpers
 
 from google.cloud.pubsub_v1 import _gapic
+from google.cloud.pubsub_v1 import _version
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.gapic import publisher_client
 from google.cloud.pubsub_v1.publisher.batch import thread
 
 
-__version__ = pkg_resources.get_distribution('google-cloud-pubsub').version
+__version__ = _version.__version__
 
 
 @_gapic.add_methods(publisher_client.PublisherClient, blacklist=('publish',))
@@ -24,6 +24,10 @@ from google.api_core import exceptions
 _LOGGER = logging.getLogger(__name__)
 _BIDIRECTIONAL_CONSUMER_NAME = 'Thread-ConsumeBidirectionalStream'
 
+# The request queue only needs put, get and qsize, so use the faster
+# queue.SimpleQueue where it is available (Python 3.7+).
+_RequestQueue = getattr(queue, 'SimpleQueue', queue.Queue)
+
 
 class _RequestQueueGenerator(object):
     """A helper for sending requests to a gRPC stream from a Queue.
@@ -167,7 +171,7 @@ class BidiRpc(object):
     def __init__(self, start_rpc, initial_request=None):
         self._start_rpc = start_rpc
         self._initial_request = initial_request
-        self._request_queue = queue.Queue()
+        self._request_queue = _RequestQueue()
         self._request_generator = None
         self._is_active = False
         self.call = None
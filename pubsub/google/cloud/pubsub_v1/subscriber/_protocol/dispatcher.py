@@ -25,7 +25,34 @@ from google.cloud.pubsub_v1.subscriber._protocol import requests
 
 _LOGGER = logging.getLogger(__name__)
 _CALLBACK_WORKER_NAME = 'Thread-CallbackRequestDispatcher'
-
+# The maximum serialized size of a single StreamingPullRequest. Pub/Sub
+# rejects streaming pull requests larger than 512 KiB.
+_MAX_REQUEST_BYTES = 512 * 1024
+# The bytes taken by the tag and length prefix of the packed
+# ``modify_deadline_seconds`` field, whose payload is always below 2 MiB.
+_PACKED_FIELD_OVERHEAD_BYTES = 4
+
+
+def _varint_size(value):
+    """Return the number of bytes used to encode an int32 as a varint."""
+    if value < 0:
+        # Negative int32 values are sign-extended to 64 bits.
+        return 10
+    size = 1
+    while value > 0x7f:
+        value >>= 7
+        size += 1
+    return size
+
+
+def _ack_id_size(ack_id):
+    """Return the serialized size of an ack ID in a repeated string field.
+
+    This is the one byte tag, the varint length prefix and the UTF-8 encoded
+    ack ID itself.
+    """
+    length = len(ack_id.encode('utf-8'))
+    return 1 + _varint_size(length) + length
 
 class Dispatcher(object):
     def __init__(self, manager, queue):
@@ -92,36 +119,90 @@ class Dispatcher(object):
 
         if batched_commands[requests.LeaseRequest]:
             self.lease(batched_commands.pop(requests.LeaseRequest))
-        if batched_commands[requests.ModAckRequest]:
-            self.modify_ack_deadline(
-                batched_commands.pop(requests.ModAckRequest))
-        # Note: Drop and ack *must* be after lease. It's possible to get both
-        # the lease the and ack/drop request in the same batch.
-        if batched_commands[requests.AckRequest]:
-            self.ack(batched_commands.pop(requests.AckRequest))
-        if batched_commands[requests.NackRequest]:
-            self.nack(batched_commands.pop(requests.NackRequest))
-        if batched_commands[requests.DropRequest]:
-            self.drop(batched_commands.pop(requests.DropRequest))
-
-    def ack(self, items):
-        """Acknowledge the given messages.
+
+        # Acks, nacks, and modacks are all just fields on a
+        # StreamingPullRequest, so send them together in as few requests as
+        # possible rather than one request per kind of action.
+        ack_items = batched_commands.pop(requests.AckRequest, [])
+        nack_items = batched_commands.pop(requests.NackRequest, [])
+        modack_items = batched_commands.pop(requests.ModAckRequest, [])
+        modack_items.extend(
+            requests.ModAckRequest(ack_id=item.ack_id, seconds=0)
+            for item in nack_items)
+
+        self._add_ack_times(ack_items)
+        self._send_requests(
+            [item.ack_id for item in ack_items], modack_items)
+
+        # Note: Drop *must* be after lease. It's possible to get both the lease
+        # and ack/nack/drop request in the same batch.
+        dropped = ack_items + nack_items
+        dropped.extend(batched_commands.pop(requests.DropRequest, []))
+        if dropped:
+            self.drop(dropped)
+
+    def _add_ack_times(self, items):
+        """Add the timing information of acked items to the histogram.
 
         Args:
-            items(Sequence[AckRequest]): The items to acknowledge.
+            items(Sequence[AckRequest]): The acknowledged items.
         """
-        # If we got timing information, add it to the histogram.
         for item in items:
             time_to_ack = item.time_to_ack
             if time_to_ack is not None:
                 self._manager.ack_histogram.add(time_to_ack)
 
-        ack_ids = [item.ack_id for item in items]
-        request = types.StreamingPullRequest(ack_ids=ack_ids)
-        self._manager.send(request)
+    def _send_requests(self, ack_ids, modack_items):
+        """Send acks and modacks using as few requests as possible.
 
-        # Remove the message from lease management.
-        self.drop(items)
+        A new request is started whenever adding another ack ID would make
+        the serialized request larger than :data:`_MAX_REQUEST_BYTES`.
+
+        Args:
+            ack_ids (Sequence[str]): The ack IDs to acknowledge.
+            modack_items (Sequence[ModAckRequest]): The ack deadline
+                modifications to make.
+        """
+        acks = []
+        modacks = []
+        size = _PACKED_FIELD_OVERHEAD_BYTES
+
+        for ack_id in ack_ids:
+            item_size = _ack_id_size(ack_id)
+            if acks and size + item_size > _MAX_REQUEST_BYTES:
+                self._send_request(acks, modacks)
+                acks = []
+                size = _PACKED_FIELD_OVERHEAD_BYTES
+            acks.append(ack_id)
+            size += item_size
+
+        for item in modack_items:
+            item_size = _ack_id_size(item.ack_id) + _varint_size(item.seconds)
+            if (acks or modacks) and size + item_size > _MAX_REQUEST_BYTES:
+                self._send_request(acks, modacks)
+                acks = []
+                modacks = []
+                size = _PACKED_FIELD_OVERHEAD_BYTES
+            modacks.append(item)
+            size += item_size
+
+        if acks or modacks:
+            self._send_request(acks, modacks)
+
+    def _send_request(self, ack_ids, modack_items):
+        """Send a single request with the given acks and modacks.
+
+        Args:
+            ack_ids (Sequence[str]): The ack IDs to acknowledge.
+            modack_items (Sequence[ModAckRequest]): The ack deadline
+                modifications to make.
+        """
+        request = types.StreamingPullRequest(
+            ack_ids=ack_ids,
+            modify_deadline_ack_ids=[item.ack_id for item in modack_items],
+            modify_deadline_seconds=[item.seconds for item in modack_items],
+        )
+        self._manager.send(request)
 
     def drop(self, items):
         """Remove the given messages from lease management.
@@ -147,23 +228,4 @@ class Dispatcher(object):
         Args:
             items(Sequence[ModAckRequest]): The items to modify.
         """
-        ack_ids = [item.ack_id for item in items]
-        seconds = [item.seconds for item in items]
-
-        request = types.StreamingPullRequest(
-            modify_deadline_ack_ids=ack_ids,
-            modify_deadline_seconds=seconds,
-        )
-        self._manager.send(request)
-
-    def nack(self, items):
-        """Explicitly deny receipt of messages.
-
-        Args:
-            items(Sequence[NackRequest]): The items to deny.
-        """
-        self.modify_ack_deadline([
-            requests.ModAckRequest(ack_id=item.ack_id, seconds=0)
-            for item in items])
-        self.drop(
-            [requests.DropRequest(*item) for item in items])
+        self._send_requests((), items)
@@ -0,0 +1,133 @@
+# Copyright 2018, Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import, division
+
+import logging
+import threading
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class FlowController(object):
+    """Bounds the messages leased by several streaming pull managers at once.
+
+    Each :class:`~.streaming_pull_manager.StreamingPullManager` enforces its
+    own flow control settings. When a single client subscribes to many
+    subscriptions, a flow controller shared by all of the managers bounds the
+    total number of outstanding messages, so that one subscription can not
+    hoard messages while starving the others.
+
+    Args:
+        max_messages (int): The maximum number of messages leased by all
+            managers combined. If ``None``, the number is not bounded.
+        max_bytes (int): The maximum size, in bytes, of the messages leased by
+            all managers combined. If ``None``, the size is not bounded.
+    """
+
+    def __init__(self, max_messages=None, max_bytes=None):
+        self._max_messages = max_messages
+        self._max_bytes = max_bytes
+        self._operational_lock = threading.Lock()
+        self._message_count = 0
+        self._bytes = 0
+        self._release_callbacks = []
+
+    @property
+    def message_count(self):
+        """int: The number of leased messages."""
+        return self._message_count
+
+    @property
+    def bytes(self):
+        """int: The total size, in bytes, of all leased messages."""
+        return self._bytes
+
+    @property
+    def load(self):
+        """Return the current load.
+
+        The load is represented as a float, where 1.0 represents having hit
+        one of the limits. See
+        :attr:`~.streaming_pull_manager.StreamingPullManager.load`.
+
+        Returns:
+            float: The load value.
+        """
+        loads = [0]
+        if self._max_messages is not None:
+            loads.append(self._message_count / self._max_messages)
+        if self._max_bytes is not None:
+            loads.append(self._bytes / self._max_bytes)
+        return max(loads)
+
+    def add_release_callback(self, callback):
+        """Schedules a callable when leased messages are released.
+
+        This allows managers that paused because of the shared limits to
+        resume once other managers release their messages.
+
+        Args:
+            callback (Callable[[], None]): The method to call.
+        """
+        with self._operational_lock:
+            self._release_callbacks.append(callback)
+
+    def remove_release_callback(self, callback):
+        """Removes a callable added with :meth:`add_release_callback`.
+
+        Args:
+            callback (Callable[[], None]): The method to remove.
+        """
+        with self._operational_lock:
+            if callback in self._release_callbacks:
+                self._release_callbacks.remove(callback)
+
+    def add(self, message_count, byte_count):
+        """Account for newly leased messages.
+
+        Args:
+            message_count (int): The number of messages leased.
+            byte_count (int): The total size, in bytes, of the messages.
+        """
+        with self._operational_lock:
+            self._message_count += message_count
+            self._bytes += byte_count
+
+    def remove(self, message_count, byte_count):
+        """Account for released messages.
+
+        Args:
+            message_count (int): The number of messages released.
+            byte_count (int): The total size, in bytes, of the messages.
+        """
+        with self._operational_lock:
+            self._message_count -= message_count
+            self._bytes -= byte_count
+            if self._message_count < 0 or self._bytes < 0:
+                _LOGGER.warning(
+                    'More messages were released than leased: %d messages, '
+                    '%d bytes', self._message_count, self._bytes)
+                self._message_count = max(0, self._message_count)
+                self._bytes = max(0, self._bytes)
+            callbacks = list(self._release_callbacks)
+
+        # Run the callbacks outside of the lock, as they check the load. A
+        # failing callback must not keep the other managers from resuming.
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                _LOGGER.exception('Error in flow controller release callback.')
@@ -66,6 +66,8 @@ class Leaser(object):
 
     def add(self, items):
         """Add messages to be managed by the leaser."""
+        added_count = 0
+        added_bytes = 0
         for item in items:
             # Add the ack ID to the set of managed ack IDs, and increment
             # the size counter.
@@ -74,17 +76,27 @@ class Leaser(object):
                     added_time=time.time(),
                     size=item.byte_size)
                 self._bytes += item.byte_size
+                added_count += 1
+                added_bytes += item.byte_size
             else:
                 _LOGGER.debug(
                     'Message %s is already lease managed', item.ack_id)
 
+        flow_controller = self._manager.flow_controller
+        if flow_controller is not None and added_count:
+            flow_controller.add(added_count, added_bytes)
+
     def remove(self, items):
         """Remove messages from lease management."""
         # Remove the ack ID from lease management, and decrement the
         # byte counter.
+        removed_count = 0
+        removed_bytes = 0
         for item in items:
             if self._leased_messages.pop(item.ack_id, None) is not None:
                 self._bytes -= item.byte_size
+                removed_count += 1
+                removed_bytes += item.byte_size
             else:
                 _LOGGER.debug('Item %s was not managed.', item.ack_id)
 
@@ -93,6 +105,10 @@ class Leaser(object):
                 'Bytes was unexpectedly negative: %d', self._bytes)
             self._bytes = 0
 
+        flow_controller = self._manager.flow_controller
+        if flow_controller is not None and removed_count:
+            flow_controller.remove(removed_count, removed_bytes)
+
     def maintain_leases(self):
         """Maintain all of the leases being managed.
 
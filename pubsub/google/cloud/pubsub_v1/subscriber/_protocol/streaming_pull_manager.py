@@ -16,14 +16,17 @@ from __future__ import division
 
 import functools
 import logging
+import math
 import threading
 
 from google.api_core import exceptions
 import grpc
+from six.moves import queue
 
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber._protocol import bidi
 from google.cloud.pubsub_v1.subscriber._protocol import dispatcher
+from google.cloud.pubsub_v1.subscriber._protocol import helper_threads
 from google.cloud.pubsub_v1.subscriber._protocol import histogram
 from google.cloud.pubsub_v1.subscriber._protocol import leaser
 from google.cloud.pubsub_v1.subscriber._protocol import requests
@@ -31,6 +34,7 @@ import google.cloud.pubsub_v1.subscriber.message
 import google.cloud.pubsub_v1.subscriber.scheduler
 
 _LOGGER = logging.getLogger(__name__)
+_BATCH_WORKER_NAME = 'Thread-MessageBatcher'
 _RETRYABLE_STREAM_ERRORS = (
     exceptions.DeadlineExceeded,
     exceptions.ServiceUnavailable,
@@ -67,6 +71,24 @@ def _wrap_callback_errors(callback, message):
         message.nack()
 
 
+def _wrap_batch_callback_errors(callback, messages):
+    """Wraps a user batch callback so that if an exception occurs all of the
+    messages in the batch are nacked.
+
+    Args:
+        callback (Callable[None, Sequence[Message]]): The user callback.
+        messages (Sequence[~Message]): The Pub/Sub messages.
+    """
+    try:
+        callback(messages)
+    except Exception:
+        _LOGGER.exception(
+            'Top-level exception occurred in callback while processing a '
+            'batch of messages')
+        for message in messages:
+            message.nack()
+
+
 class StreamingPullManager(object):
     """The streaming pull manager coordinates pulling messages from Pub/Sub,
     leasing them, and scheduling them to be processed.
@@ -82,18 +104,24 @@ class StreamingPullManager(object):
         scheduler (~google.cloud.pubsub_v1.scheduler.Scheduler): The scheduler
             to use to process messages. If not provided, a thread pool-based
             scheduler will be used.
+        flow_controller (~.flow_controller.FlowController): An optional flow
+            controller shared with other managers. If provided, the manager
+            also pauses when the shared limits are reached.
     """
 
     def __init__(self, client, subscription, flow_control=types.FlowControl(),
-                 scheduler=None):
+                 scheduler=None, flow_controller=None):
         self._client = client
         self._subscription = subscription
         self._flow_control = flow_control
+        self._flow_controller = flow_controller
         self._ack_histogram = histogram.Histogram()
         self._last_histogram_size = 0
         self._ack_deadline = 10
         self._rpc = None
+        self._initial_request_template = None
         self._callback = None
+        self._batch_queue = None
         self._closing = threading.Lock()
         self._closed = False
         self._close_callbacks = []
@@ -108,6 +136,7 @@ class StreamingPullManager(object):
         self._dispatcher = None
         self._leaser = None
         self._consumer = None
+        self._batcher = None
 
     @property
     def is_active(self):
@@ -124,6 +153,12 @@ class StreamingPullManager(object):
         settings."""
         return self._flow_control
 
+    @property
+    def flow_controller(self):
+        """Optional[~.flow_controller.FlowController]: The flow controller
+        shared with other managers, if any."""
+        return self._flow_controller
+
     @property
     def dispatcher(self):
         """google.cloud.pubsub_v1.subscriber._protocol.dispatcher.Dispatcher:
@@ -176,18 +211,25 @@ class StreamingPullManager(object):
         There are (currently) two flow control settings; this property
         computes how close the manager is to each of them, and returns
         whichever value is higher. (It does not matter that we have lots of
-        running room on setting A if setting B is over.)
+        running room on setting A if setting B is over.) If the manager has a
+        shared flow controller, its load is taken into account as well.
 
         Returns:
             float: The load value.
         """
-        if self._leaser is None:
+        # The leaser is read once, as this can be called from another
+        # manager's thread while this manager is closing.
+        leaser = self._leaser
+        if leaser is None:
             return 0
 
-        return max([
-            self._leaser.message_count / self._flow_control.max_messages,
-            self._leaser.bytes / self._flow_control.max_bytes,
-        ])
+        loads = [
+            leaser.message_count / self._flow_control.max_messages,
+            leaser.bytes / self._flow_control.max_bytes,
+        ]
+        if self._flow_controller is not None:
+            loads.append(self._flow_controller.load)
+        return max(loads)
 
     def add_close_callback(self, callback):
         """Schedules a callable when the manager closes.
@@ -212,11 +254,16 @@ class StreamingPullManager(object):
         # In order to not thrash too much, require us to have passed below
         # the resume threshold (80% by default) of each flow control setting
         # before restarting.
-        if not self._consumer.is_paused:
+        #
+        # The consumer is read once, as this can be called from another
+        # manager's thread (see :meth:`_on_flow_controller_release`) while
+        # :meth:`close` clears it.
+        consumer = self._consumer
+        if consumer is None or not consumer.is_paused:
             return
 
         if self.load < self.flow_control.resume_threshold:
-            self._consumer.resume()
+            consumer.resume()
         else:
             _LOGGER.debug('Did not resume, current load is %s', self.load)
 
@@ -224,13 +271,20 @@ class StreamingPullManager(object):
         """Queue a request to be sent to the RPC."""
         self._rpc.send(request)
 
-    def open(self, callback):
+    def open(self, callback, batch_size=None, batch_max_latency=0):
         """Begin consuming messages.
 
         Args:
             callback (Callable[None, google.cloud.pubsub_v1.message.Messages]):
                 A callback that will be called for each message received on the
-                stream.
+                stream. If ``batch_size`` is set, it is instead called with
+                lists of messages.
+            batch_size (int): If set, received messages are collected into
+                batches of at most this many messages, and ``callback`` is
+                called once per batch.
+            batch_max_latency (float): The maximum amount of time in seconds
+                to wait for additional messages before calling ``callback``
+                with a partial batch. Only used if ``batch_size`` is set.
         """
         if self.is_active:
             raise ValueError('This manager is already open.')
@@ -239,7 +293,13 @@ class StreamingPullManager(object):
             raise ValueError(
                 'This manager has been closed and can not be re-used.')
 
-        self._callback = functools.partial(_wrap_callback_errors, callback)
+        if batch_size is None:
+            self._callback = functools.partial(
+                _wrap_callback_errors, callback)
+        else:
+            self._callback = functools.partial(
+                _wrap_batch_callback_errors, callback)
+            self._start_batcher(batch_size, batch_max_latency)
 
         # Start the thread to pass the requests.
         self._dispatcher = dispatcher.Dispatcher(self, self._scheduler.queue)
@@ -259,6 +319,12 @@ class StreamingPullManager(object):
         self._leaser = leaser.Leaser(self)
         self._leaser.start()
 
+        # Messages released by other managers sharing the flow controller
+        # may allow this manager to resume.
+        if self._flow_controller is not None:
+            self._flow_controller.add_release_callback(
+                self._on_flow_controller_release)
+
     def close(self, reason=None):
         """Stop consuming messages and shutdown all helper threads.
 
@@ -280,15 +346,31 @@ class StreamingPullManager(object):
             self._consumer = None
 
             # Shutdown all helper threads
+            if self._batcher is not None:
+                # The messages still waiting to be batched are discarded, just
+                # like the callbacks still pending in the scheduler. Their
+                # leases are no longer extended, so Pub/Sub redelivers them
+                # once their ack deadlines expire.
+                _LOGGER.debug('Stopping message batcher.')
+                self._batch_queue.put(helper_threads.STOP)
+                self._batcher.join()
+                self._batcher = None
             _LOGGER.debug('Stopping scheduler.')
             self._scheduler.shutdown()
             self._scheduler = None
             _LOGGER.debug('Stopping leaser.')
             self._leaser.stop()
-            self._leaser = None
             _LOGGER.debug('Stopping dispatcher.')
             self._dispatcher.stop()
             self._dispatcher = None
+            # Release the remaining leased messages only once the dispatcher
+            # has stopped, so that a late drop can not release them twice.
+            if self._flow_controller is not None:
+                self._flow_controller.remove_release_callback(
+                    self._on_flow_controller_release)
+                self._flow_controller.remove(
+                    self._leaser.message_count, self._leaser.bytes)
+            self._leaser = None
 
             self._rpc = None
             self._closed = True
@@ -297,6 +379,41 @@ class StreamingPullManager(object):
             for callback in self._close_callbacks:
                 callback(self, reason)
 
+    def _on_flow_controller_release(self):
+        # This is called from other managers' threads, possibly while this
+        # manager is shutting down.
+        self.maybe_resume_consumer()
+
+    def _start_batcher(self, batch_size, batch_max_latency):
+        """Start a thread to collect received messages into batches.
+
+        Args:
+            batch_size (int): The maximum number of messages in a batch.
+            batch_max_latency (float): The maximum amount of time in seconds
+                to wait for additional messages.
+        """
+        self._batch_queue = queue.Queue()
+        worker = helper_threads.QueueCallbackWorker(
+            self._batch_queue,
+            self._schedule_batch,
+            max_items=batch_size,
+            max_latency=batch_max_latency,
+        )
+        thread = threading.Thread(name=_BATCH_WORKER_NAME, target=worker)
+        thread.daemon = True
+        thread.start()
+        _LOGGER.debug('Started helper thread %s', thread.name)
+        self._batcher = thread
+
+    def _schedule_batch(self, messages):
+        """Schedule the callback to process a batch of messages.
+
+        Batches are discarded once the manager is closing, which clears the
+        consumer before stopping the batcher.
+        """
+        if messages and self._consumer is not None:
+            self._scheduler.schedule(self._callback, messages)
+
     def _get_initial_request(self):
         """Return the initial request for the RPC.
 
@@ -308,17 +425,25 @@ class StreamingPullManager(object):
             suitable for being the first request on the stream (and not
             suitable for any other purpose).
         """
+        # The subscription never changes, so it is only set once on a
+        # template that is copied every time the stream is (re-)opened. Later
+        # requests on the stream do not need to carry it at all.
+        if self._initial_request_template is None:
+            self._initial_request_template = types.StreamingPullRequest(
+                subscription=self._subscription)
+
         # Any ack IDs that are under lease management need to have their
         # deadline extended immediately.
-        lease_ids = self._leaser.ack_ids
+        lease_ids = list(self._leaser.ack_ids)
 
         # Put the request together.
-        request = types.StreamingPullRequest(
-            modify_deadline_ack_ids=list(lease_ids),
-            modify_deadline_seconds=[self.ack_deadline] * len(lease_ids),
-            stream_ack_deadline_seconds=self.ack_histogram.percentile(99),
-            subscription=self._subscription,
-        )
+        request = types.StreamingPullRequest()
+        request.CopyFrom(self._initial_request_template)
+        request.stream_ack_deadline_seconds = (
+            self.ack_histogram.percentile(99))
+        request.modify_deadline_ack_ids.extend(lease_ids)
+        request.modify_deadline_seconds.extend(
+            [self.ack_deadline] * len(lease_ids))
 
         # Return the initial request.
         return request
@@ -335,6 +460,11 @@ class StreamingPullManager(object):
         After the messages have all had their ack deadline updated, execute
         the callback for each message using the executor.
         """
+        # Responses without messages have nothing to modack or schedule, and
+        # sending an empty modack request would be a wasted round trip.
+        if not response.received_messages:
+            return
+
         _LOGGER.debug(
             'Scheduling callbacks for %s messages.',
             len(response.received_messages))
@@ -353,7 +483,10 @@ class StreamingPullManager(object):
                 received_message.ack_id,
                 self._scheduler.queue)
             # TODO: Immediately lease instead of using the callback queue.
-            self._scheduler.schedule(self._callback, message)
+            if self._batch_queue is not None:
+                self._batch_queue.put(message)
+            else:
+                self._scheduler.schedule(self._callback, message)
 
     def _should_recover(self, exception):
         """Determine if an error on the RPC stream should be recovered.
@@ -380,3 +513,162 @@ class StreamingPullManager(object):
             'RPC termination has signaled streaming pull manager shutdown.')
         future = _maybe_wrap_exception(future)
         self.close(reason=future)
+
+
+def _divide_limit(name, limit, num_streams):
+    """Divide a flow control limit evenly between several streams.
+
+    Args:
+        name (str): The name of the flow control setting, used in errors.
+        limit (Union[int, float]): The limit for all of the streams.
+        num_streams (int): The number of streams.
+
+    Returns:
+        Union[int, float]: The limit for each stream.
+
+    Raises:
+        ValueError: If ``limit`` is smaller than ``num_streams``.
+    """
+    # ``inf // n`` is ``nan``, so infinite limits are passed through as is.
+    if math.isinf(limit):
+        return limit
+    if limit < num_streams:
+        raise ValueError(
+            'The {} flow control setting ({}) must be at least the number '
+            'of streams ({}).'.format(name, limit, num_streams))
+    return limit // num_streams
+
+
+class MultiStreamingPullManager(object):
+    """Pulls messages for a single subscription over several streams.
+
+    Pub/Sub limits the throughput of each streaming pull stream, so a single
+    :class:`StreamingPullManager` can not receive messages faster than that
+    limit no matter what the flow control settings are. This runs several
+    managers side by side, each with its own stream, and presents them as a
+    single manager. If any of the streams shuts down, all of them are shut
+    down.
+
+    The flow control limits are divided evenly between the streams so that
+    the total number of outstanding messages stays the same. Infinite limits
+    stay infinite for every stream.
+
+    Args:
+        client (~.pubsub_v1.subscriber.client): The subscriber client used
+            to create this instance.
+        subscription (str): The name of the subscription. The canonical
+            format for this is
+            ``projects/{project}/subscriptions/{subscription}``.
+        flow_control (~google.cloud.pubsub_v1.types.FlowControl): The flow
+            control settings, shared among all streams.
+        num_streams (int): The number of streams to open.
+        flow_controller (~.flow_controller.FlowController): An optional flow
+            controller shared with other managers.
+
+    Raises:
+        ValueError: If the ``max_messages`` or ``max_bytes`` flow control
+            limit is smaller than ``num_streams``, as every stream must be
+            allowed at least one message (and byte).
+    """
+
+    def __init__(self, client, subscription, flow_control=types.FlowControl(),
+                 num_streams=1, flow_controller=None):
+        stream_flow_control = flow_control._replace(
+            max_bytes=_divide_limit(
+                'max_bytes', flow_control.max_bytes, num_streams),
+            max_messages=_divide_limit(
+                'max_messages', flow_control.max_messages, num_streams),
+        )
+        self._managers = [
+            StreamingPullManager(
+                client, subscription, stream_flow_control,
+                flow_controller=flow_controller)
+            for _ in range(num_streams)
+        ]
+        self._closing = threading.Lock()
+        self._closed = False
+        self._close_callbacks = []
+
+        for manager in self._managers:
+            manager.add_close_callback(self._on_manager_close)
+
+    @property
+    def managers(self):
+        """Sequence[StreamingPullManager]: The managers of each stream."""
+        return self._managers
+
+    @property
+    def is_active(self):
+        """bool: True if any of the streams is actively streaming."""
+        return any(manager.is_active for manager in self._managers)
+
+    def add_close_callback(self, callback):
+        """Schedules a callable when the manager closes.
+
+        Args:
+            callback (Callable): The method to call.
+        """
+        self._close_callbacks.append(callback)
+
+    def open(self, callback, batch_size=None, batch_max_latency=0):
+        """Begin consuming messages on all streams.
+
+        Args:
+            callback (Callable[None, google.cloud.pubsub_v1.message.Messages]):
+                A callback that will be called for each message received on
+                any of the streams.
+            batch_size (int): If set, ``callback`` is called with batches of
+                at most this many messages. See
+                :meth:`StreamingPullManager.open`.
+            batch_max_latency (float): The maximum amount of time in seconds
+                to wait for a batch to fill up.
+        """
+        opened = []
+        try:
+            for manager in self._managers:
+                manager.open(
+                    callback, batch_size=batch_size,
+                    batch_max_latency=batch_max_latency)
+                opened.append(manager)
+        except Exception:
+            # Stop the streams that were already opened, as the caller has
+            # nothing to close them with. The managers that were never opened
+            # have no helper threads to stop, and closing them would fail, so
+            # this is marked as closed first to keep the close callbacks of
+            # the opened managers from closing them.
+            with self._closing:
+                self._closed = True
+            for manager in opened:
+                manager.close()
+            raise
+
+    def close(self, reason=None):
+        """Stop consuming messages on all streams.
+
+        This method is idempotent. Additional calls will have no effect.
+
+        Args:
+            reason (Any): The reason to close this. If None, this is considered
+                an "intentional" shutdown. This is passed to the callbacks
+                specified via :meth:`add_close_callback`.
+        """
+        self._close(reason)
+
+    def _close(self, reason, closed_manager=None):
+        with self._closing:
+            if self._closed:
+                return
+            self._closed = True
+
+        # The manager that triggered the shutdown (if any) is already closing
+        # and holds its own lock, so it must not be closed again here.
+        for manager in self._managers:
+            if manager is not closed_manager:
+                manager.close(reason=reason)
+
+        for callback in self._close_callbacks:
+            callback(self, reason)
+
+    def _on_manager_close(self, manager, reason):
+        _LOGGER.debug('A stream has shut down, stopping the other streams.')
+        self._close(reason, closed_manager=manager)
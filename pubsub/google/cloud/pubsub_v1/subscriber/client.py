@@ -14,22 +14,117 @@
 
 from __future__ import absolute_import
 
-import pkg_resources
+import collections
 import os
+import threading
 
 import grpc
+import six
 
 from google.api_core import grpc_helpers
 
 from google.cloud.pubsub_v1 import _gapic
+from google.cloud.pubsub_v1 import _version
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.gapic import subscriber_client
 from google.cloud.pubsub_v1.subscriber import futures
+from google.cloud.pubsub_v1.subscriber._protocol import flow_controller
 from google.cloud.pubsub_v1.subscriber._protocol import streaming_pull_manager
 from google.cloud.pubsub_v1.subscriber.policy import thread
 
 
-__version__ = pkg_resources.get_distribution('google-cloud-pubsub').version
+__version__ = _version.__version__
+
+# The largest response the channel accepts. This is the default ``max_bytes``
+# flow control setting (100 MiB) with 25% headroom, so that the channel
+# refuses oversized responses instead of buffering an unbounded amount of
+# data. It does not depend on the flow control settings passed to
+# :meth:`Client.subscribe_experimental`.
+_MAX_RECEIVE_MESSAGE_LENGTH = 125 * 1024 * 1024
+
+# The options used for the default channel. These set appropriate message size
+# limits and keepalive options. Keepalive pings are sent even when the stream
+# is idle, so that idle streaming pulls are not silently dropped by proxies and
+# load balancers. The larger HTTP/2 write buffer lets batches of acks be
+# written with fewer syscalls. The larger maximum frame size lets the server
+# send large responses in fewer frames (it only limits the frames received).
+# BDP probing lets gRPC size the receive flow control window to the
+# connection.
+_CHANNEL_OPTIONS = (
+    ('grpc.max_send_message_length', -1),
+    ('grpc.max_receive_message_length', _MAX_RECEIVE_MESSAGE_LENGTH),
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.http2.min_time_between_pings_ms', 10000),
+    ('grpc.http2.write_buffer_size', 1024 * 1024),
+    ('grpc.http2.max_frame_size', 1024 * 1024),
+    ('grpc.http2.bdp_probe', 1),
+)
+
+# Channels created for clients, keyed by the settings used to create them.
+_CHANNEL_CACHE_SIZE = 8
+_channel_cache = collections.OrderedDict()
+_channel_cache_lock = threading.Lock()
+
+
+def _get_or_create_channel(credentials, target, scopes, options):
+    """Return a shared channel for the given settings.
+
+    Creating a channel requires a new connection (and TLS handshake), so
+    clients created with ``share_channel=True`` and the same settings share a
+    channel instead. gRPC channels are thread-safe and multiplex all calls
+    over one connection. The most recently used channels are kept.
+
+    gRPC channels can not be used across :func:`os.fork`, so channels are
+    only shared within the process that created them.
+
+    Args:
+        credentials (google.auth.credentials.Credentials): The credentials
+            used by the channel. If ``None``, the default credentials are
+            used.
+        target (str): The target service address.
+        scopes (Sequence[str]): The OAuth scopes for the credentials.
+        options (Sequence[Tuple[str, Any]]): The gRPC channel options.
+
+    Returns:
+        grpc.Channel: The channel.
+    """
+    # The credentials object itself (rather than its id) is part of the key,
+    # which also keeps it alive for as long as the channel is cached.
+    key = (os.getpid(), credentials, target, tuple(scopes), options)
+    with _channel_cache_lock:
+        channel = _channel_cache.pop(key, None)
+        if channel is None:
+            channel = grpc_helpers.create_channel(
+                credentials=credentials,
+                target=target,
+                scopes=scopes,
+                options=options,
+            )
+        _channel_cache[key] = channel
+        while len(_channel_cache) > _CHANNEL_CACHE_SIZE:
+            _channel_cache.popitem(last=False)
+    return channel
+
+
+def _intern_subscription(subscription):
+    """Return the canonical instance of a subscription name.
+
+    Subscription names are long and the same name is held by every policy
+    and manager created for it, so equal names share a single string.
+
+    Args:
+        subscription (str): The name of the subscription.
+
+    Returns:
+        str: The interned name. Names that can not be interned (such as
+        ``unicode`` names on Python 2) are returned unchanged.
+    """
+    if isinstance(subscription, str):
+        return six.moves.intern(subscription)
+    return subscription
 
 
 @_gapic.add_methods(subscriber_client.SubscriberClient,
@@ -48,34 +143,54 @@ class Client(object):
             class in order to define your own consumer. This is primarily
             provided to allow use of different concurrency models; the default
             is based on :class:`threading.Thread`.
+        max_outstanding_messages (int): The maximum number of messages
+            leased at once across all subscriptions opened with
+            :meth:`subscribe_experimental`. This is in addition to the
+            per-subscription flow control settings, and prevents a single
+            subscription from hoarding messages while starving the others.
+            If not provided, the total is not bounded.
+        max_outstanding_bytes (int): The maximum total size, in bytes, of the
+            messages leased at once across all subscriptions opened with
+            :meth:`subscribe_experimental`. If not provided, the total is not
+            bounded.
+        share_channel (bool): (Optional.) If :data:`True`, clients created
+            with the same settings in the same process share one channel (and
+            so one connection). This saves connections when creating many
+            short-lived clients, but all of the streams of the sharing
+            clients are then multiplexed over a single connection. Defaults
+            to :data:`False`, which gives each client its own channel.
         kwargs (dict): Any additional arguments provided are sent as keyword
             keyword arguments to the underlying
             :class:`~.gapic.pubsub.v1.subscriber_client.SubscriberClient`.
             Generally, you should not need to set additional keyword
             arguments.
     """
-    def __init__(self, policy_class=thread.Policy, **kwargs):
+    def __init__(self, policy_class=thread.Policy,
+                 max_outstanding_messages=None, max_outstanding_bytes=None,
+                 share_channel=False, **kwargs):
         # Sanity check: Is our goal to use the emulator?
         # If so, create a grpc insecure channel with the emulator host
-        # as the target.
+        # as the target. The host may also be a Unix domain socket (such as
+        # ``unix:/tmp/pubsub.sock``), which avoids the loopback TCP stack.
         if os.environ.get('PUBSUB_EMULATOR_HOST'):
             kwargs['channel'] = grpc.insecure_channel(
                 target=os.environ.get('PUBSUB_EMULATOR_HOST'),
+                options=_CHANNEL_OPTIONS,
             )
 
         # Use a custom channel.
         # We need this in order to set appropriate default message size and
         # keepalive options.
         if 'channel' not in kwargs:
-            kwargs['channel'] = grpc_helpers.create_channel(
+            if share_channel:
+                create_channel = _get_or_create_channel
+            else:
+                create_channel = grpc_helpers.create_channel
+            kwargs['channel'] = create_channel(
                 credentials=kwargs.pop('credentials', None),
                 target=self.target,
                 scopes=subscriber_client.SubscriberClient._DEFAULT_SCOPES,
-                options={
-                    'grpc.max_send_message_length': -1,
-                    'grpc.max_receive_message_length': -1,
-                    'grpc.keepalive_time_ms': 30000,
-                }.items(),
+                options=_CHANNEL_OPTIONS,
             )
 
         # Add the metrics headers, and instantiate the underlying GAPIC
@@ -86,6 +201,14 @@ class Client(object):
         # messages.
         self._policy_class = policy_class
 
+        # The flow controller shared by every streaming pull manager.
+        self._flow_controller = None
+        if (max_outstanding_messages is not None or
+                max_outstanding_bytes is not None):
+            self._flow_controller = flow_controller.FlowController(
+                max_messages=max_outstanding_messages,
+                max_bytes=max_outstanding_bytes)
+
     @property
     def target(self):
         """Return the target (where the API is).
@@ -135,18 +258,25 @@ class Client(object):
         Raises:
             TypeError: If ``callback`` is not callable.
         """
-        flow_control = types.FlowControl(*flow_control)
+        if not isinstance(flow_control, types.FlowControl):
+            flow_control = types.FlowControl(*flow_control)
+        subscription = _intern_subscription(subscription)
         subscr = self._policy_class(self, subscription, flow_control)
-        if callable(callback):
-            subscr.open(callback)
-        elif callback is not None:
+        if callback is None:
+            return subscr
+
+        # Check the callback before opening, as opening starts the background
+        # threads that would only fail later when invoking the callback.
+        if not callable(callback):
             error = '{!r} is not callable, please check input'.format(callback)
             raise TypeError(error)
+        subscr.open(callback)
         return subscr
 
     def subscribe_experimental(
-            self, subscription, callback, flow_control=(),
-            scheduler_=None):
+            self, subscription, callback=None, flow_control=(),
+            scheduler_=None, max_streams=1, batch_callback=None,
+            batch_size=100, batch_max_latency=0.05):
         """Asynchronously start receiving messages on a given subscription.
 
         This method starts a background thread to begin pulling messages from
@@ -168,6 +298,18 @@ class Client(object):
         settings may lead to faster throughput for messages that do not take
         a long time to process.
 
+        Each stream opened to Pub/Sub has a limited throughput. For very high
+        volume subscriptions, ``max_streams`` can be used to pull messages
+        over several streams at once. The ``flow_control`` limits are divided
+        evenly between the streams.
+
+        Instead of ``callback``, a ``batch_callback`` can be provided. It is
+        called with a list of messages, which allows processing many messages
+        at once (for example, with a single bulk write to a database).
+        Messages are collected until there are ``batch_size`` of them or
+        ``batch_max_latency`` seconds have passed. If an exception occurs in
+        the ``batch_callback``, every message in the batch is ``nack()`` ed.
+
         This method starts the receiver in the background and returns a
         *Future* representing its execution. Waiting on the future (calling
         ``result()``) will block forever or until a non-recoverable error
@@ -209,18 +351,69 @@ class Client(object):
             flow_control (~.pubsub_v1.types.FlowControl): The flow control
                 settings. Use this to prevent situations where you are
                 inundated with too many messages at once.
+            scheduler_ (~.pubsub_v1.subscriber.scheduler.Scheduler): The
+                scheduler used to run the ``callback``. If not provided, a
+                thread pool-based scheduler is used. This can not be combined
+                with more than one stream, as each stream needs its own
+                scheduler.
+            max_streams (int): The number of streams used to pull messages.
+            batch_callback (Callable[Sequence[
+                    ~.pubsub_v1.subscriber.message.Message]]):
+                The callback function to use instead of ``callback``. This
+                function receives a list of messages as its only argument.
+            batch_size (int): The maximum number of messages passed to
+                ``batch_callback`` at once.
+            batch_max_latency (float): The maximum amount of time in seconds
+                to wait for a batch to fill up before calling
+                ``batch_callback``.
 
         Returns:
             google.cloud.pubsub_v1.futures.StreamingPullFuture: A Future object
                 that can be used to manage the background stream.
-        """
-        flow_control = types.FlowControl(*flow_control)
 
-        manager = streaming_pull_manager.StreamingPullManager(
-            self, subscription, flow_control)
+        Raises:
+            ValueError: If not exactly one of ``callback`` and
+                ``batch_callback`` is provided, if ``batch_size`` is less
+                than one with ``batch_callback``, if ``max_streams`` is less
+                than one, if ``scheduler_`` is provided with more than one
+                stream, or if the ``max_messages`` or ``max_bytes`` flow
+                control limit is smaller than ``max_streams``.
+        """
+        if (callback is None) == (batch_callback is None):
+            raise ValueError(
+                'Exactly one of callback and batch_callback must be provided.')
+
+        if batch_callback is not None and (
+                batch_size is None or batch_size < 1):
+            raise ValueError(
+                'batch_size must be at least 1 when using batch_callback.')
+
+        if max_streams < 1:
+            raise ValueError('max_streams must be at least 1.')
+
+        if not isinstance(flow_control, types.FlowControl):
+            flow_control = types.FlowControl(*flow_control)
+
+        subscription = _intern_subscription(subscription)
+        if max_streams == 1:
+            manager = streaming_pull_manager.StreamingPullManager(
+                self, subscription, flow_control, scheduler=scheduler_,
+                flow_controller=self._flow_controller)
+        elif scheduler_ is not None:
+            raise ValueError(
+                'A custom scheduler can not be used with multiple streams.')
+        else:
+            manager = streaming_pull_manager.MultiStreamingPullManager(
+                self, subscription, flow_control, num_streams=max_streams,
+                flow_controller=self._flow_controller)
 
         future = futures.StreamingPullFuture(manager)
 
-        manager.open(callback)
+        if batch_callback is None:
+            manager.open(callback)
+        else:
+            manager.open(
+                batch_callback, batch_size=batch_size,
+                batch_max_latency=batch_max_latency)
 
         return future
@@ -70,14 +70,16 @@ class StreamingPullFuture(futures.Future):
 
     This future is resolved when the process is stopped (via :meth:`cancel`) or
     if it encounters an unrecoverable error. Calling `.result()` will cause
-    the calling thread to block indefinitely.
+    the calling thread to block indefinitely. The thread waits on an event
+    that is set when the manager closes, so it does not consume any CPU
+    while blocked.
     """
 
     def __init__(self, manager):
         super(StreamingPullFuture, self).__init__()
         self._manager = manager
         self._manager.add_close_callback(self._on_close_callback)
-        self._cancelled = True
+        self._cancelled = False
 
     def _on_close_callback(self, manager, result):
         if result is None:
@@ -117,6 +117,12 @@ class ThreadScheduler(object):
         """
         # Drop all pending item from the executor. Without this, the executor
         # will block until all pending items are complete, which is
-        # undesirable.
-        self._executor._work_queue.queue.clear()
+        # undesirable. The work queue is a SimpleQueue on Python 3.7+, which
+        # has no underlying ``queue`` to clear, so it is drained instead.
+        work_queue = self._executor._work_queue
+        try:
+            while True:
+                work_queue.get_nowait()
+        except queue.Empty:
+            pass
         self._executor.shutdown()
@@ -163,6 +163,8 @@ class TestBidiRpc(object):
         bidi_rpc = bidi.BidiRpc(None)
 
         assert bidi_rpc.is_active is False
+        assert isinstance(bidi_rpc._request_queue, bidi._RequestQueue)
+        assert bidi_rpc.pending_requests == 0
 
     def test_done_callbacks(self):
         bidi_rpc = bidi.BidiRpc(None)
@@ -26,11 +26,8 @@ import pytest
 
 
 @pytest.mark.parametrize('item,method_name', [
-    (requests.AckRequest(0, 0, 0), 'ack'),
     (requests.DropRequest(0, 0), 'drop'),
     (requests.LeaseRequest(0, 0), 'lease'),
-    (requests.ModAckRequest(0, 0), 'modify_ack_deadline'),
-    (requests.NackRequest(0, 0), 'nack')
 ])
 def test_dispatch_callback(item, method_name):
     manager = mock.create_autospec(
@@ -45,49 +42,107 @@ def test_dispatch_callback(item, method_name):
     method.assert_called_once_with([item])
 
 
-def test_dispatch_callback_inactive():
+def test_dispatch_callback_coalesces_requests():
     manager = mock.create_autospec(
         streaming_pull_manager.StreamingPullManager, instance=True)
-    manager.is_active = False
     dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
-    dispatcher_.dispatch_callback([requests.AckRequest(0, 0, 0)])
+    items = [
+        requests.AckRequest(ack_id='ack', byte_size=10, time_to_ack=20),
+        requests.ModAckRequest(ack_id='modack', seconds=60),
+        requests.NackRequest(ack_id='nack', byte_size=10),
+        requests.DropRequest(ack_id='drop', byte_size=10),
+    ]
+    dispatcher_.dispatch_callback(items)
+
+    manager.send.assert_called_once_with(types.StreamingPullRequest(
+        ack_ids=['ack'],
+        modify_deadline_ack_ids=['modack', 'nack'],
+        modify_deadline_seconds=[60, 0],
+    ))
+    manager.ack_histogram.add.assert_called_once_with(20)
+    manager.leaser.remove.assert_called_once_with(
+        [items[0], items[2], items[3]])
 
-    manager.send.assert_not_called()
 
+def test_dispatch_callback_splits_large_batches():
+    manager = mock.create_autospec(
+        streaming_pull_manager.StreamingPullManager, instance=True)
+    dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
-def test_ack():
+    # Real ack IDs are around 200 bytes long.
+    def make_ack_id(prefix, index):
+        return '{}{:06d}'.format(prefix, index).ljust(200, 'x')
+
+    ack_ids = [make_ack_id('ack', i) for i in range(3000)]
+    modack_ids = [make_ack_id('modack', i) for i in range(3000)]
+    items = [
+        requests.AckRequest(ack_id=ack_id, byte_size=0, time_to_ack=None)
+        for ack_id in ack_ids]
+    items.extend(
+        requests.ModAckRequest(ack_id=ack_id, seconds=600)
+        for ack_id in modack_ids)
+    dispatcher_.dispatch_callback(items)
+
+    sent = [call[1][0] for call in manager.send.mock_calls]
+    assert len(sent) > 1
+    for request in sent:
+        assert request.ByteSize() <= dispatcher._MAX_REQUEST_BYTES
+        assert len(request.modify_deadline_ack_ids) == len(
+            request.modify_deadline_seconds)
+    # Every request except the last one is filled up to the limit.
+    for request in sent[:-1]:
+        assert request.ByteSize() > dispatcher._MAX_REQUEST_BYTES - 210
+    assert [ack_id for request in sent for ack_id in request.ack_ids] == (
+        ack_ids)
+    assert [
+        ack_id for request in sent
+        for ack_id in request.modify_deadline_ack_ids] == modack_ids
+
+
+def test_dispatch_callback_ack_no_time():
     manager = mock.create_autospec(
         streaming_pull_manager.StreamingPullManager, instance=True)
     dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
     items = [requests.AckRequest(
-        ack_id='ack_id_string', byte_size=0, time_to_ack=20)]
-    dispatcher_.ack(items)
+        ack_id='ack_id_string', byte_size=0, time_to_ack=None)]
+    dispatcher_.dispatch_callback(items)
 
     manager.send.assert_called_once_with(types.StreamingPullRequest(
         ack_ids=['ack_id_string'],
     ))
+    manager.ack_histogram.add.assert_not_called()
 
-    manager.leaser.remove.assert_called_once_with(items)
-    manager.maybe_resume_consumer.assert_called_once()
-    manager.ack_histogram.add.assert_called_once_with(20)
 
+@pytest.mark.parametrize('value,expected', [
+    (0, 1),
+    (127, 1),
+    (128, 2),
+    (600, 2),
+    (2 ** 31 - 1, 5),
+    (-1, 10),
+])
+def test__varint_size(value, expected):
+    assert dispatcher._varint_size(value) == expected
 
-def test_ack_no_time():
+
+def test__ack_id_size():
+    ack_id = 'x' * 200
+    request = types.StreamingPullRequest(ack_ids=[ack_id])
+
+    assert dispatcher._ack_id_size(ack_id) == request.ByteSize()
+
+
+def test_dispatch_callback_inactive():
     manager = mock.create_autospec(
         streaming_pull_manager.StreamingPullManager, instance=True)
+    manager.is_active = False
     dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
-    items = [requests.AckRequest(
-        ack_id='ack_id_string', byte_size=0, time_to_ack=None)]
-    dispatcher_.ack(items)
-
-    manager.send.assert_called_once_with(types.StreamingPullRequest(
-        ack_ids=['ack_id_string'],
-    ))
+    dispatcher_.dispatch_callback([requests.AckRequest(0, 0, 0)])
 
-    manager.ack_histogram.add.assert_not_called()
+    manager.send.assert_not_called()
 
 
 def test_lease():
@@ -114,32 +169,28 @@ def test_drop():
     manager.maybe_resume_consumer.assert_called_once()
 
 
-def test_nack():
+def test_modify_ack_deadline():
     manager = mock.create_autospec(
         streaming_pull_manager.StreamingPullManager, instance=True)
     dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
-    items = [requests.NackRequest(ack_id='ack_id_string', byte_size=10)]
-    dispatcher_.nack(items)
+    items = [requests.ModAckRequest(ack_id='ack_id_string', seconds=60)]
+    dispatcher_.modify_ack_deadline(items)
 
     manager.send.assert_called_once_with(types.StreamingPullRequest(
         modify_deadline_ack_ids=['ack_id_string'],
-        modify_deadline_seconds=[0],
+        modify_deadline_seconds=[60],
     ))
 
 
-def test_modify_ack_deadline():
+def test_modify_ack_deadline_empty():
     manager = mock.create_autospec(
         streaming_pull_manager.StreamingPullManager, instance=True)
     dispatcher_ = dispatcher.Dispatcher(manager, mock.sentinel.queue)
 
-    items = [requests.ModAckRequest(ack_id='ack_id_string', seconds=60)]
-    dispatcher_.modify_ack_deadline(items)
+    dispatcher_.modify_ack_deadline([])
 
-    manager.send.assert_called_once_with(types.StreamingPullRequest(
-        modify_deadline_ack_ids=['ack_id_string'],
-        modify_deadline_seconds=[60],
-    ))
+    manager.send.assert_not_called()
 
 
 @mock.patch('threading.Thread', autospec=True)
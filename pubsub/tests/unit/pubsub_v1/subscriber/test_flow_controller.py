@@ -0,0 +1,93 @@
+# Copyright 2018, Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from google.cloud.pubsub_v1.subscriber._protocol import flow_controller
+
+
+def test_constructor_and_default_state():
+    controller = flow_controller.FlowController()
+
+    assert controller.message_count == 0
+    assert controller.bytes == 0
+    assert controller.load == 0
+
+
+def test_add_and_remove():
+    controller = flow_controller.FlowController(
+        max_messages=10, max_bytes=1000)
+
+    controller.add(1, 150)
+    assert controller.message_count == 1
+    assert controller.bytes == 150
+    assert controller.load == 0.15
+
+    controller.add(3, 50)
+    assert controller.load == 0.4
+
+    controller.remove(2, 100)
+    assert controller.message_count == 2
+    assert controller.bytes == 100
+    assert controller.load == 0.2
+
+
+def test_remove_never_negative(caplog):
+    controller = flow_controller.FlowController(max_messages=10)
+
+    controller.add(1, 10)
+    controller.remove(2, 20)
+
+    assert controller.message_count == 0
+    assert controller.bytes == 0
+    assert 'More messages were released than leased' in caplog.text
+
+
+def test_load_unbounded():
+    controller = flow_controller.FlowController(max_bytes=100)
+
+    controller.add(1000, 50)
+
+    assert controller.load == 0.5
+
+
+def test_release_callbacks():
+    controller = flow_controller.FlowController(max_messages=10)
+    callback = mock.Mock()
+
+    controller.add_release_callback(callback)
+    controller.add(2, 0)
+    callback.assert_not_called()
+
+    controller.remove(1, 0)
+    callback.assert_called_once_with()
+
+    controller.remove_release_callback(callback)
+    controller.remove_release_callback(callback)
+    controller.remove(1, 0)
+    callback.assert_called_once_with()
+
+
+def test_release_callback_error():
+    controller = flow_controller.FlowController(max_messages=10)
+    failing = mock.Mock(side_effect=AttributeError('closed'))
+    callback = mock.Mock()
+
+    controller.add_release_callback(failing)
+    controller.add_release_callback(callback)
+    controller.add(1, 0)
+    controller.remove(1, 0)
+
+    failing.assert_called_once_with()
+    callback.assert_called_once_with()
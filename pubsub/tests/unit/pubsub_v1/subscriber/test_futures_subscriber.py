@@ -19,6 +19,7 @@ import pytest
 
 from google.auth import credentials
 from google.cloud.pubsub_v1 import subscriber
+from google.cloud.pubsub_v1.publisher import exceptions
 from google.cloud.pubsub_v1.subscriber import futures
 from google.cloud.pubsub_v1.subscriber.policy import thread
 from google.cloud.pubsub_v1.subscriber._protocol import streaming_pull_manager
@@ -58,6 +59,7 @@ class TestStreamingPullFuture(object):
 
         assert future.running()
         assert not future.done()
+        assert not future.cancelled()
         future._manager.add_close_callback.assert_called_once_with(
             future._on_close_callback)
 
@@ -79,6 +81,16 @@ class TestStreamingPullFuture(object):
 
         assert not future.running()
 
+    def test_result_blocks_until_closed(self):
+        future = self.make_future()
+
+        with pytest.raises(exceptions.TimeoutError):
+            future.result(timeout=0.01)
+
+        future._on_close_callback(mock.sentinel.manager, None)
+
+        assert future.result(timeout=0.01) is True
+
     def test_cancel(self):
         future = self.make_future()
 
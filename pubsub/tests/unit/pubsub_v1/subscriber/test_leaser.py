@@ -17,6 +17,7 @@ import threading
 
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber._protocol import dispatcher
+from google.cloud.pubsub_v1.subscriber._protocol import flow_controller
 from google.cloud.pubsub_v1.subscriber._protocol import histogram
 from google.cloud.pubsub_v1.subscriber._protocol import leaser
 from google.cloud.pubsub_v1.subscriber._protocol import requests
@@ -26,8 +27,20 @@ import mock
 import pytest
 
 
+def create_manager(flow_control=types.FlowControl()):
+    manager = mock.create_autospec(
+        streaming_pull_manager.StreamingPullManager, instance=True)
+    manager.dispatcher = mock.create_autospec(
+        dispatcher.Dispatcher, instance=True)
+    manager.is_active = True
+    manager.flow_control = flow_control
+    manager.ack_histogram = histogram.Histogram()
+    manager.flow_controller = None
+    return manager
+
+
 def test_add_and_remove():
-    leaser_ = leaser.Leaser(mock.sentinel.manager)
+    leaser_ = leaser.Leaser(create_manager())
 
     leaser_.add([
         requests.LeaseRequest(ack_id='ack1', byte_size=50)])
@@ -46,10 +59,33 @@ def test_add_and_remove():
     assert leaser_.bytes == 25
 
 
+def test_add_and_remove_flow_controller():
+    manager = create_manager()
+    manager.flow_controller = mock.create_autospec(
+        flow_controller.FlowController, instance=True)
+    leaser_ = leaser.Leaser(manager)
+
+    leaser_.add([
+        requests.LeaseRequest(ack_id='ack1', byte_size=50),
+        requests.LeaseRequest(ack_id='ack2', byte_size=25)])
+    leaser_.add([
+        requests.LeaseRequest(ack_id='ack1', byte_size=50)])
+
+    manager.flow_controller.add.assert_called_once_with(2, 75)
+
+    leaser_.remove([
+        requests.DropRequest(ack_id='ack1', byte_size=50),
+        requests.DropRequest(ack_id='ack3', byte_size=10)])
+    leaser_.remove([
+        requests.DropRequest(ack_id='ack3', byte_size=10)])
+
+    manager.flow_controller.remove.assert_called_once_with(1, 50)
+
+
 def test_add_already_managed(caplog):
     caplog.set_level(logging.DEBUG)
 
-    leaser_ = leaser.Leaser(mock.sentinel.manager)
+    leaser_ = leaser.Leaser(create_manager())
 
     leaser_.add([
         requests.LeaseRequest(ack_id='ack1', byte_size=50)])
@@ -62,7 +98,7 @@ def test_add_already_managed(caplog):
 def test_remove_not_managed(caplog):
     caplog.set_level(logging.DEBUG)
 
-    leaser_ = leaser.Leaser(mock.sentinel.manager)
+    leaser_ = leaser.Leaser(create_manager())
 
     leaser_.remove([
         requests.DropRequest(ack_id='ack1', byte_size=50)])
@@ -73,7 +109,7 @@ def test_remove_not_managed(caplog):
 def test_remove_negative_bytes(caplog):
     caplog.set_level(logging.DEBUG)
 
-    leaser_ = leaser.Leaser(mock.sentinel.manager)
+    leaser_ = leaser.Leaser(create_manager())
 
     leaser_.add([
         requests.LeaseRequest(ack_id='ack1', byte_size=50)])
@@ -84,17 +120,6 @@ def test_remove_negative_bytes(caplog):
     assert 'unexpectedly negative' in caplog.text
 
 
-def create_manager(flow_control=types.FlowControl()):
-    manager = mock.create_autospec(
-        streaming_pull_manager.StreamingPullManager, instance=True)
-    manager.dispatcher = mock.create_autospec(
-        dispatcher.Dispatcher, instance=True)
-    manager.is_active = True
-    manager.flow_control = flow_control
-    manager.ack_histogram = histogram.Histogram()
-    return manager
-
-
 def test_maintain_leases_inactive(caplog):
     caplog.set_level(logging.INFO)
     manager = create_manager()
@@ -14,6 +14,7 @@
 
 import mock
 import pytest
+from six.moves import queue
 
 from google.api_core import exceptions
 from google.cloud.pubsub_v1 import types
@@ -23,6 +24,7 @@ from google.cloud.pubsub_v1.subscriber import message
 from google.cloud.pubsub_v1.subscriber import scheduler
 from google.cloud.pubsub_v1.subscriber._protocol import bidi
 from google.cloud.pubsub_v1.subscriber._protocol import dispatcher
+from google.cloud.pubsub_v1.subscriber._protocol import flow_controller
 from google.cloud.pubsub_v1.subscriber._protocol import leaser
 from google.cloud.pubsub_v1.subscriber._protocol import requests
 from google.cloud.pubsub_v1.subscriber._protocol import streaming_pull_manager
@@ -58,6 +60,28 @@ def test__wrap_callback_errors_error():
     msg.nack.assert_called_once()
 
 
+def test__wrap_batch_callback_errors_no_error():
+    msgs = [mock.create_autospec(message.Message, instance=True)]
+    callback = mock.Mock()
+
+    streaming_pull_manager._wrap_batch_callback_errors(callback, msgs)
+
+    callback.assert_called_once_with(msgs)
+    msgs[0].nack.assert_not_called()
+
+
+def test__wrap_batch_callback_errors_error():
+    msgs = [
+        mock.create_autospec(message.Message, instance=True)
+        for _ in range(2)]
+    callback = mock.Mock(side_effect=ValueError('meep'))
+
+    streaming_pull_manager._wrap_batch_callback_errors(callback, msgs)
+
+    for msg in msgs:
+        msg.nack.assert_called_once()
+
+
 def test_constructor_and_default_state():
     manager = streaming_pull_manager.StreamingPullManager(
         mock.sentinel.client,
@@ -136,6 +160,21 @@ def test_lease_load_and_pause():
     manager._consumer.pause.assert_called_once()
 
 
+def test_load_flow_controller():
+    controller = flow_controller.FlowController(max_messages=4)
+    manager = make_manager(
+        flow_control=types.FlowControl(max_messages=10, max_bytes=1000),
+        flow_controller=controller)
+    manager._leaser = leaser.Leaser(manager)
+
+    manager.leaser.add([requests.LeaseRequest(ack_id='one', byte_size=150)])
+    assert manager.load == 0.25
+
+    # Messages leased by other managers count towards the shared limit.
+    controller.add(3, 0)
+    assert manager.load == 1.0
+
+
 def test_drop_and_resume():
     manager = make_manager(
         flow_control=types.FlowControl(max_messages=10, max_bytes=1000))
@@ -225,6 +264,109 @@ def test_open(dispatcher, leaser, background_consumer, resumable_bidi_rpc):
     assert manager.is_active is True
 
 
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.bidi.ResumableBidiRpc',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.bidi.BackgroundConsumer',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.leaser.Leaser',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.dispatcher.Dispatcher',
+    autospec=True)
+def test_open_batched(dispatcher, leaser, background_consumer,
+                      resumable_bidi_rpc):
+    manager = make_manager()
+
+    manager.open(mock.sentinel.callback, batch_size=2, batch_max_latency=0)
+
+    assert manager._callback.func is (
+        streaming_pull_manager._wrap_batch_callback_errors)
+    batcher = manager._batcher
+    assert batcher.is_alive()
+
+    manager.close()
+
+    assert manager._batcher is None
+    assert not batcher.is_alive()
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.bidi.ResumableBidiRpc',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.bidi.BackgroundConsumer',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.leaser.Leaser',
+    autospec=True)
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.dispatcher.Dispatcher',
+    autospec=True)
+def test_open_and_close_flow_controller(
+        dispatcher, leaser, background_consumer, resumable_bidi_rpc):
+    controller = mock.create_autospec(
+        flow_controller.FlowController, instance=True)
+    manager = make_manager(flow_controller=controller)
+
+    manager.open(mock.sentinel.callback)
+
+    controller.add_release_callback.assert_called_once_with(
+        manager._on_flow_controller_release)
+
+    manager.leaser.message_count = 2
+    manager.leaser.bytes = 20
+    manager.close()
+
+    controller.remove_release_callback.assert_called_once_with(
+        manager._on_flow_controller_release)
+    controller.remove.assert_called_once_with(2, 20)
+
+
+def test__on_flow_controller_release():
+    manager = make_manager()
+    manager._leaser = mock.create_autospec(leaser.Leaser, instance=True)
+    manager._leaser.message_count = 0
+    manager._leaser.bytes = 0
+    consumer = mock.create_autospec(bidi.BackgroundConsumer, instance=True)
+    consumer.is_paused = True
+    manager._consumer = consumer
+
+    manager._on_flow_controller_release()
+
+    consumer.resume.assert_called_once_with()
+
+
+def test__on_flow_controller_release_closed():
+    manager = make_manager()
+
+    # The manager has been closed, so there is no consumer to resume.
+    manager._on_flow_controller_release()
+
+
+def test_close_flow_controller_after_dispatcher():
+    manager, _, dispatcher_, leaser_, _ = make_running_manager()
+    controller = mock.create_autospec(
+        flow_controller.FlowController, instance=True)
+    manager._flow_controller = controller
+    leaser_.message_count = 2
+    leaser_.bytes = 20
+
+    # Record the order in which the dispatcher and controller are called.
+    parent = mock.Mock()
+    parent.attach_mock(dispatcher_.stop, 'dispatcher_stop')
+    parent.attach_mock(controller.remove, 'controller_remove')
+
+    manager.close()
+
+    assert parent.mock_calls == [
+        mock.call.dispatcher_stop(),
+        mock.call.controller_remove(2, 20),
+    ]
+
+
 def test_open_already_active():
     manager = make_manager()
     manager._consumer = mock.create_autospec(
@@ -318,6 +460,25 @@ def test__get_initial_request():
     assert initial_request.modify_deadline_seconds == [10, 10]
 
 
+def test__get_initial_request_reuses_template():
+    manager = make_manager()
+    manager._leaser = mock.create_autospec(
+        leaser.Leaser, instance=True)
+    manager._leaser.ack_ids = ['1']
+
+    first_request = manager._get_initial_request()
+    template = manager._initial_request_template
+    manager._leaser.ack_ids = []
+    second_request = manager._get_initial_request()
+
+    assert manager._initial_request_template is template
+    assert template == types.StreamingPullRequest(
+        subscription='subscription-name')
+    assert first_request.modify_deadline_ack_ids == ['1']
+    assert second_request.subscription == 'subscription-name'
+    assert second_request.modify_deadline_ack_ids == []
+
+
 def test_on_response():
     manager, _, dispatcher, _, scheduler = make_running_manager()
     manager._callback = mock.sentinel.callback
@@ -352,6 +513,61 @@ def test_on_response():
         assert isinstance(call[1][1], message.Message)
 
 
+def test_on_response_no_messages():
+    manager, _, dispatcher, _, scheduler = make_running_manager()
+    manager._callback = mock.sentinel.callback
+
+    manager._on_response(types.StreamingPullResponse())
+
+    dispatcher.modify_ack_deadline.assert_not_called()
+    scheduler.schedule.assert_not_called()
+
+
+def test_on_response_batched():
+    manager, _, dispatcher, _, scheduler = make_running_manager()
+    manager._callback = mock.sentinel.callback
+    manager._batch_queue = queue.Queue()
+
+    response = types.StreamingPullResponse(
+        received_messages=[
+            types.ReceivedMessage(
+                ack_id='fack',
+                message=types.PubsubMessage(data=b'foo', message_id='1')
+            ),
+        ],
+    )
+
+    manager._on_response(response)
+
+    scheduler.schedule.assert_not_called()
+    queued = manager._batch_queue.get_nowait()
+    assert isinstance(queued, message.Message)
+    assert queued._ack_id == 'fack'
+
+
+def test__schedule_batch():
+    manager = make_manager()
+    manager._callback = mock.sentinel.callback
+    manager._consumer = mock.create_autospec(
+        bidi.BackgroundConsumer, instance=True)
+
+    manager._schedule_batch([])
+    manager._scheduler.schedule.assert_not_called()
+
+    manager._schedule_batch([mock.sentinel.message])
+    manager._scheduler.schedule.assert_called_once_with(
+        mock.sentinel.callback, [mock.sentinel.message])
+
+
+def test__schedule_batch_closing():
+    manager = make_manager()
+    manager._callback = mock.sentinel.callback
+
+    manager._schedule_batch([mock.sentinel.message])
+
+    manager._scheduler.schedule.assert_not_called()
+
+
 def test_retryable_stream_errors():
     # Make sure the config matches our hard-coded tuple of exceptions.
     interfaces = subscriber_client_config.config['interfaces']
@@ -394,3 +610,124 @@ def test__on_rpc_done():
         manager._on_rpc_done(mock.sentinel.error)
 
     close.assert_called_once_with(reason=mock.sentinel.error)
+
+
+def make_multi_manager(num_streams=3, **kwargs):
+    client_ = mock.create_autospec(client.Client, instance=True)
+    return streaming_pull_manager.MultiStreamingPullManager(
+        client_, 'subscription-name', num_streams=num_streams, **kwargs)
+
+
+def test_multi_constructor():
+    manager = make_multi_manager(
+        flow_control=types.FlowControl(max_messages=10, max_bytes=300))
+
+    assert len(manager.managers) == 3
+    for stream_manager in manager.managers:
+        assert stream_manager.flow_control.max_messages == 3
+        assert stream_manager.flow_control.max_bytes == 100
+        assert stream_manager.flow_controller is None
+    assert manager.is_active is False
+
+
+def test_multi_constructor_infinite_limits():
+    manager = make_multi_manager(
+        flow_control=types.FlowControl(
+            max_messages=float('inf'), max_bytes=float('inf')))
+
+    for stream_manager in manager.managers:
+        assert stream_manager.flow_control.max_messages == float('inf')
+        assert stream_manager.flow_control.max_bytes == float('inf')
+
+
+@pytest.mark.parametrize('flow_control', [
+    types.FlowControl(max_messages=2),
+    types.FlowControl(max_bytes=2),
+])
+def test_multi_constructor_limit_too_small(flow_control):
+    with pytest.raises(ValueError):
+        make_multi_manager(num_streams=3, flow_control=flow_control)
+
+
+def test_multi_constructor_flow_controller():
+    manager = make_multi_manager(flow_controller=mock.sentinel.controller)
+
+    for stream_manager in manager.managers:
+        assert stream_manager.flow_controller is mock.sentinel.controller
+
+
+def test_multi_open():
+    manager = make_multi_manager()
+
+    with mock.patch.object(
+            streaming_pull_manager.StreamingPullManager, 'open',
+            autospec=True) as open_:
+        manager.open(mock.sentinel.callback)
+
+    assert open_.mock_calls == [
+        mock.call(
+            stream_manager, mock.sentinel.callback, batch_size=None,
+            batch_max_latency=0)
+        for stream_manager in manager.managers]
+
+
+def test_multi_open_failure_closes_opened():
+    manager = make_multi_manager()
+    callback = mock.Mock()
+    manager.add_close_callback(callback)
+    first, second, third = manager.managers
+
+    def open_(stream_manager, *args, **kwargs):
+        if stream_manager is second:
+            raise ValueError('open failed')
+
+    with mock.patch.object(
+            streaming_pull_manager.StreamingPullManager, 'open',
+            autospec=True, side_effect=open_) as open_mock:
+        with mock.patch.object(
+                streaming_pull_manager.StreamingPullManager, 'close',
+                autospec=True) as close:
+            with pytest.raises(ValueError):
+                manager.open(mock.sentinel.callback)
+
+    assert [call[1][0] for call in open_mock.mock_calls] == [first, second]
+    close.assert_called_once_with(first)
+    callback.assert_not_called()
+
+    # The manager can not be closed again.
+    manager.close()
+    callback.assert_not_called()
+
+
+def test_multi_close():
+    manager = make_multi_manager()
+    callback = mock.Mock()
+    manager.add_close_callback(callback)
+
+    with mock.patch.object(
+            streaming_pull_manager.StreamingPullManager, 'close',
+            autospec=True) as close:
+        manager.close()
+        manager.close()
+
+    assert close.mock_calls == [
+        mock.call(stream_manager, reason=None)
+        for stream_manager in manager.managers]
+    callback.assert_called_once_with(manager, None)
+
+
+def test_multi_stream_failure_closes_others():
+    manager = make_multi_manager()
+    callback = mock.Mock()
+    manager.add_close_callback(callback)
+    failed, others = manager.managers[0], manager.managers[1:]
+
+    with mock.patch.object(
+            streaming_pull_manager.StreamingPullManager, 'close',
+            autospec=True) as close:
+        manager._on_manager_close(failed, mock.sentinel.error)
+
+    assert close.mock_calls == [
+        mock.call(stream_manager, reason=mock.sentinel.error)
+        for stream_manager in others]
+    callback.assert_called_once_with(manager, mock.sentinel.error)
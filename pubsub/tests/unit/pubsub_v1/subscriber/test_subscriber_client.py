@@ -17,16 +17,59 @@ import mock
 import pytest
 
 from google.cloud.pubsub_v1 import subscriber
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.subscriber import client as client_module
 from google.cloud.pubsub_v1.subscriber import futures
 from google.cloud.pubsub_v1.subscriber.policy import thread
 
 
+@pytest.fixture(autouse=True)
+def clear_channel_cache():
+    client_module._channel_cache.clear()
+    yield
+    client_module._channel_cache.clear()
+
+
 def test_init():
     creds = mock.Mock(spec=credentials.Credentials)
     client = subscriber.Client(credentials=creds)
     assert client._policy_class is thread.Policy
 
 
+def test_init_flow_controller():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+    assert client._flow_controller is None
+
+    client = subscriber.Client(
+        credentials=creds, max_outstanding_messages=10,
+        max_outstanding_bytes=1000)
+    assert client._flow_controller is not None
+
+    client._flow_controller.add(5, 100)
+    assert client._flow_controller.load == 0.5
+
+
+@mock.patch('google.api_core.grpc_helpers.create_channel', autospec=True)
+def test_init_channel_options(create_channel):
+    creds = mock.Mock(spec=credentials.Credentials)
+    subscriber.Client(credentials=creds)
+
+    create_channel.assert_called_once()
+    options = create_channel.call_args[1]['options']
+    assert options is client_module._CHANNEL_OPTIONS
+    options = dict(options)
+    assert options['grpc.max_receive_message_length'] == (
+        125 * 1024 * 1024)
+    assert options['grpc.keepalive_time_ms'] == 30000
+    assert options['grpc.keepalive_timeout_ms'] == 10000
+    assert options['grpc.keepalive_permit_without_calls'] == 1
+    assert options['grpc.http2.max_pings_without_data'] == 0
+    assert options['grpc.http2.write_buffer_size'] == 1024 * 1024
+    assert options['grpc.http2.max_frame_size'] == 1024 * 1024
+    assert options['grpc.http2.bdp_probe'] == 1
+
+
 def test_init_emulator(monkeypatch):
     monkeypatch.setenv('PUBSUB_EMULATOR_HOST', '/baz/bacon/')
     # NOTE: When the emulator host is set, a custom channel will be used, so
@@ -41,6 +84,80 @@ def test_init_emulator(monkeypatch):
     assert channel.target().decode('utf8') == '/baz/bacon/'
 
 
+def test_init_does_not_share_channel():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client_a = subscriber.Client(credentials=creds)
+    client_b = subscriber.Client(credentials=creds)
+
+    channel_a = client_a.api.subscriber_stub.Pull._channel
+    assert client_b.api.subscriber_stub.Pull._channel is not channel_a
+    assert not client_module._channel_cache
+
+
+def test_init_shares_channel():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client_a = subscriber.Client(credentials=creds, share_channel=True)
+    client_b = subscriber.Client(credentials=creds, share_channel=True)
+    client_c = subscriber.Client(
+        credentials=mock.Mock(spec=credentials.Credentials),
+        share_channel=True)
+
+    channel_a = client_a.api.subscriber_stub.Pull._channel
+    assert client_b.api.subscriber_stub.Pull._channel is channel_a
+    assert client_c.api.subscriber_stub.Pull._channel is not channel_a
+
+
+@mock.patch('os.getpid', autospec=True)
+@mock.patch('google.api_core.grpc_helpers.create_channel', autospec=True)
+def test__get_or_create_channel_per_process(create_channel, getpid):
+    create_channel.side_effect = lambda **kwargs: mock.Mock()
+
+    getpid.return_value = 1
+    parent_channel = client_module._get_or_create_channel(
+        mock.sentinel.credentials, 'target', (), ())
+
+    # A forked child must not reuse the parent's channel.
+    getpid.return_value = 2
+    child_channel = client_module._get_or_create_channel(
+        mock.sentinel.credentials, 'target', (), ())
+    assert child_channel is not parent_channel
+
+
+@mock.patch('google.api_core.grpc_helpers.create_channel', autospec=True)
+def test__get_or_create_channel_evicts(create_channel):
+    create_channel.side_effect = lambda **kwargs: mock.Mock()
+    cache_size = client_module._CHANNEL_CACHE_SIZE
+
+    channels = [
+        client_module._get_or_create_channel(
+            mock.sentinel.credentials, 'target{}'.format(index), (), ())
+        for index in range(cache_size + 1)]
+    assert len(client_module._channel_cache) == cache_size
+
+    # The oldest channel was evicted, so it is created again.
+    channel = client_module._get_or_create_channel(
+        mock.sentinel.credentials, 'target0', (), ())
+    assert channel is not channels[0]
+    assert create_channel.call_count == cache_size + 2
+
+    # The most recent ones are still cached.
+    channel = client_module._get_or_create_channel(
+        mock.sentinel.credentials, 'target{}'.format(cache_size), (), ())
+    assert channel is channels[-1]
+    assert create_channel.call_count == cache_size + 2
+
+
+@mock.patch('grpc.insecure_channel', autospec=True)
+def test_init_emulator_unix_socket(insecure_channel, monkeypatch):
+    monkeypatch.setenv('PUBSUB_EMULATOR_HOST', 'unix:/tmp/pubsub.sock')
+
+    subscriber.Client()
+
+    insecure_channel.assert_called_once_with(
+        target='unix:/tmp/pubsub.sock',
+        options=client_module._CHANNEL_OPTIONS)
+
+
 def test_subscribe():
     creds = mock.Mock(spec=credentials.Credentials)
     client = subscriber.Client(credentials=creds)
@@ -48,6 +165,19 @@ def test_subscribe():
     assert isinstance(subscription, thread.Policy)
 
 
+def test_subscribe_flow_control():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    flow_control = types.FlowControl(max_messages=42)
+    subscription = client.subscribe('sub_name_a', flow_control=flow_control)
+    assert subscription.flow_control is flow_control
+
+    subscription = client.subscribe('sub_name_a', flow_control=(1024, 42))
+    assert subscription.flow_control == types.FlowControl(
+        max_bytes=1024, max_messages=42)
+
+
 def test_subscribe_with_callback():
     creds = mock.Mock(spec=credentials.Credentials)
     client = subscriber.Client(credentials=creds)
@@ -62,8 +192,10 @@ def test_subscribe_with_failed_callback():
     creds = mock.Mock(spec=credentials.Credentials)
     client = subscriber.Client(credentials=creds)
     callback = 'abcdefg'
-    with pytest.raises(TypeError) as exc_info:
-        client.subscribe('sub_name_b', callback)
+    with mock.patch.object(thread.Policy, 'open') as open_:
+        with pytest.raises(TypeError) as exc_info:
+            client.subscribe('sub_name_b', callback)
+        open_.assert_not_called()
     assert callback in str(exc_info.value)
 
 
@@ -79,3 +211,125 @@ def test_subscribe_experimental(manager_open):
     assert isinstance(future, futures.StreamingPullFuture)
 
     manager_open.assert_called_once_with(mock.ANY, mock.sentinel.callback)
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.streaming_pull_manager.'
+    'StreamingPullManager.open', autospec=True)
+def test_subscribe_experimental_interns_subscription(manager_open):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+    # Build equal names at runtime, so that they are distinct objects.
+    name_a = ''.join(['projects/p/', 'subscriptions/s'])
+    name_b = ''.join(['projects/p/', 'subscriptions/s'])
+    assert name_a is not name_b
+
+    future_a = client.subscribe_experimental(
+        name_a, callback=mock.sentinel.callback)
+    future_b = client.subscribe_experimental(
+        name_b, callback=mock.sentinel.callback)
+
+    assert future_a._manager._subscription is future_b._manager._subscription
+
+
+def test__intern_subscription_unchanged():
+    subscription = mock.sentinel.subscription
+    assert client_module._intern_subscription(subscription) is subscription
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.streaming_pull_manager.'
+    'StreamingPullManager.open', autospec=True)
+def test_subscribe_experimental_scheduler(manager_open):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    future = client.subscribe_experimental(
+        'sub_name_a', callback=mock.sentinel.callback,
+        scheduler_=mock.sentinel.scheduler)
+
+    assert future._manager._scheduler is mock.sentinel.scheduler
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.streaming_pull_manager.'
+    'StreamingPullManager.open', autospec=True)
+def test_subscribe_experimental_flow_controller(manager_open):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(
+        credentials=creds, max_outstanding_messages=10)
+
+    future = client.subscribe_experimental(
+        'sub_name_a', callback=mock.sentinel.callback)
+
+    assert future._manager.flow_controller is client._flow_controller
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.streaming_pull_manager.'
+    'MultiStreamingPullManager.open', autospec=True)
+def test_subscribe_experimental_max_streams(manager_open):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    future = client.subscribe_experimental(
+        'sub_name_a', callback=mock.sentinel.callback, max_streams=4)
+    assert isinstance(future, futures.StreamingPullFuture)
+    assert len(future._manager.managers) == 4
+
+    manager_open.assert_called_once_with(mock.ANY, mock.sentinel.callback)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'max_streams': 0},
+    {'max_streams': 2, 'scheduler_': mock.sentinel.scheduler},
+    {'max_streams': 4, 'flow_control': types.FlowControl(max_messages=3)},
+])
+def test_subscribe_experimental_invalid_streams(kwargs):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    with pytest.raises(ValueError):
+        client.subscribe_experimental(
+            'sub_name_a', callback=mock.sentinel.callback, **kwargs)
+
+
+@mock.patch(
+    'google.cloud.pubsub_v1.subscriber._protocol.streaming_pull_manager.'
+    'StreamingPullManager.open', autospec=True)
+def test_subscribe_experimental_batch_callback(manager_open):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    future = client.subscribe_experimental(
+        'sub_name_a', batch_callback=mock.sentinel.batch_callback,
+        batch_size=10, batch_max_latency=1)
+    assert isinstance(future, futures.StreamingPullFuture)
+
+    manager_open.assert_called_once_with(
+        mock.ANY, mock.sentinel.batch_callback, batch_size=10,
+        batch_max_latency=1)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'callback': mock.sentinel.callback,
+     'batch_callback': mock.sentinel.batch_callback},
+])
+def test_subscribe_experimental_invalid_callbacks(kwargs):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    with pytest.raises(ValueError):
+        client.subscribe_experimental('sub_name_a', **kwargs)
+
+
+@pytest.mark.parametrize('batch_size', [None, 0])
+def test_subscribe_experimental_invalid_batch_size(batch_size):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+
+    with pytest.raises(ValueError):
+        client.subscribe_experimental(
+            'sub_name_a', batch_callback=mock.sentinel.batch_callback,
+            batch_size=batch_size)